@@ -1,21 +1,274 @@
 import streamlit as st
-import openai
-import json
-from pydantic import BaseModel
+from openai import (OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError,
+                    InternalServerError, RateLimitError)
+import httpx
+import asyncio
+import threading
+import queue
+import orjson
+import time
+import gzip
+import os
+import faiss
+import numpy as np
+from pydantic import BaseModel, ConfigDict
 from typing import List
+from string import Template
 import random
 
-# === Secure key from Streamlit Cloud secrets ===
-openai.api_key = st.secrets["openai_api_key"]
+# === Pooled OpenAI clients, shared across sessions and reruns ===
+# st.cache_resource keeps a single client per process, so the keep-alive
+# connections survive Streamlit reruns instead of paying a fresh TCP+TLS
+# handshake per call. HTTP/2 lets concurrent requests multiplex over one
+# kept-alive connection instead of opening one socket each.
+_LIMITS = dict(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+
+@st.cache_resource
+def get_client():
+    return OpenAI(api_key=st.secrets["openai_api_key"],
+                  http_client=httpx.Client(http2=True, limits=httpx.Limits(**_LIMITS)))
+
+@st.cache_resource
+def get_async_client():
+    return AsyncOpenAI(api_key=st.secrets["openai_api_key"],
+                       http_client=httpx.AsyncClient(http2=True, limits=httpx.Limits(**_LIMITS)))
+
+# === Models ===
+# Pinned snapshots: cheaper and faster than the gpt-3.5-turbo alias for
+# these small JSON outputs, and immune to silent alias re-routing.
+MODEL_GEN = "gpt-4o-mini-2024-07-18"
+MODEL_SCORE = "gpt-4o-mini-2024-07-18"
+
+# === Background event loop ===
+# A process-wide loop on a daemon thread lets us start API work (like the
+# AI-rebuttal prefetch) before the user asks for it, and keep it running
+# across Streamlit reruns.
+@st.cache_resource
+def get_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+# === Transient-error retry ===
+# With server-enforced output schemas the old parse-and-redo loops are
+# unnecessary; the only failures worth retrying are rate limits and
+# transient server/network errors, with exponential backoff and jitter.
+_RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+def with_backoff(call, attempts=5):
+    for attempt in range(1, attempts + 1):
+        try:
+            return call()
+        except _RETRYABLE:
+            if attempt == attempts:
+                raise
+            time.sleep(min(2 ** attempt, 30) * (0.5 + random.random() / 2))
+
+async def awith_backoff(call, attempts=5):
+    for attempt in range(1, attempts + 1):
+        try:
+            return await call()
+        except _RETRYABLE:
+            if attempt == attempts:
+                raise
+            await asyncio.sleep(min(2 ** attempt, 30) * (0.5 + random.random() / 2))
+
+# === Output-token budgets ===
+# The max_tokens values started as hand-picked guesses. Completion sizes
+# are logged per call type; once 100 samples accumulate the budget is
+# re-derived as p95 + 10% and persisted, so budgets converge on what the
+# schema actually needs. Tighter budgets cut worst-case generation time
+# and remove the truncated-JSON failure mode.
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+_DEFAULT_MAX_TOK = {"full": 1400, "score": 200, "rebut": 700}
+
+@st.cache_resource
+def _token_budgets():
+    budgets = dict(_DEFAULT_MAX_TOK)
+    try:
+        with open(CONFIG_PATH, "rb") as fh:
+            budgets.update(orjson.loads(fh.read()).get("max_tokens", {}))
+    except OSError:
+        pass
+    return {"budgets": budgets, "samples": {}, "lock": threading.Lock()}
+
+def max_tok(call_type):
+    return _token_budgets()["budgets"][call_type]
+
+def record_completion_tokens(call_type, n):
+    state = _token_budgets()
+    with state["lock"]:
+        samples = state["samples"].setdefault(call_type, [])
+        samples.append(n)
+        if len(samples) < 100:
+            return
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        state["budgets"][call_type] = int(p95 * 1.1) + 1
+        samples.clear()
+        try:
+            with open(CONFIG_PATH, "wb") as fh:
+                fh.write(orjson.dumps({"max_tokens": state["budgets"]}))
+        except OSError:
+            pass
+
+# === Response cache ===
+# Identical (model, temperature, messages) triples come up constantly: the
+# motions are drawn from a fixed list and users re-click Generate. A disk
+# cache hit replaces a 1-3 s API call with a local lookup and bills nothing.
+@st.cache_data(ttl=7*24*3600, persist="disk", show_spinner=False)
+def cached_chat(model, temperature, messages_json, max_tokens, response_format=None, usage_key=None):
+    kwargs = {"response_format": response_format} if response_format else {}
+    r = with_backoff(lambda: get_client().chat.completions.create(
+        model=model, temperature=temperature,
+        messages=orjson.loads(messages_json), max_tokens=max_tokens, **kwargs
+    ))
+    if usage_key and r.usage:
+        record_completion_tokens(usage_key, r.usage.completion_tokens)
+    return r.choices[0].message.content
+
+def _cache_enabled():
+    # Only meaningful on the script thread: coroutines on the background
+    # loop see Streamlit's mock session state, so they receive the toggle
+    # value as a parameter instead of reading it themselves.
+    return st.session_state.get("use_cache", True)
+
+def _should_cache(temperature, use_cache):
+    # Low-temperature calls (scoring) are effectively deterministic, so
+    # always reuse them; the sidebar toggle only governs creative
+    # generations where users may legitimately want a fresh roll.
+    return temperature <= 0.3 or use_cache
+
+def chat(model, temperature, messages, max_tokens, response_format=None, usage_key=None):
+    """Single sync entry point for completions; caching is a sidebar toggle."""
+    if _should_cache(temperature, _cache_enabled()):
+        messages_json = orjson.dumps(messages, option=orjson.OPT_SORT_KEYS)
+        return cached_chat(model, temperature, messages_json, max_tokens, response_format, usage_key)
+    kwargs = {"response_format": response_format} if response_format else {}
+    r = with_backoff(lambda: get_client().chat.completions.create(
+        model=model, temperature=temperature, messages=messages, max_tokens=max_tokens, **kwargs
+    ))
+    if usage_key and r.usage:
+        record_completion_tokens(usage_key, r.usage.completion_tokens)
+    return r.choices[0].message.content
+
+# === Semantic cache ===
+# The exact-match cache misses when users retype a motion with small edits
+# ("Ban TikTok" vs "This House Would ban TikTok"). Embed the lookup key and
+# reuse the nearest cached result when it is close enough in meaning.
+SEM_EMBED_MODEL = "text-embedding-3-small"
+SEM_DIM = 1536
+SEM_THRESHOLD = 0.92
+
+@st.cache_resource
+def sem_cache():
+    # Inner product over L2-normalised vectors == cosine similarity. The
+    # lock keeps index and payloads aligned: lookups and stores run
+    # concurrently on to_thread workers and script threads, and two
+    # interleaved stores would permanently map vectors to the wrong
+    # payloads (same pattern as _token_budgets).
+    return {"index": faiss.IndexFlatIP(SEM_DIM), "payloads": [], "lock": threading.Lock()}
+
+def _sem_embed(key):
+    emb = with_backoff(lambda: get_client().embeddings.create(
+        model=SEM_EMBED_MODEL, input=key)).data[0].embedding
+    vec = np.asarray([emb], dtype="float32")
+    faiss.normalize_L2(vec)
+    return vec
+
+def sem_lookup(key):
+    """Returns (cached payload or None, embedding vector for later storage)."""
+    cache = sem_cache()
+    vec = _sem_embed(key)
+    with cache["lock"]:
+        index = cache["index"]
+        if index.ntotal:
+            D, I = index.search(vec, 1)
+            if D[0, 0] >= SEM_THRESHOLD:
+                return cache["payloads"][I[0, 0]], vec
+    return None, vec
+
+def sem_store(vec, payload):
+    cache = sem_cache()
+    with cache["lock"]:
+        cache["index"].add(vec)
+        cache["payloads"].append(payload)
+
+# === Bounded concurrency ===
+# The generation plus the speculative rebuttal prefetch can burst past
+# the account RPM limit, and 429-triggered backoff stalls cost far more
+# than queueing ever would. Every async call goes through a shared
+# semaphore so bursts self-throttle just below the ceiling. All work runs
+# on the single shared background loop; the slider value is pushed from
+# the script thread (coroutines see Streamlit's mock session state) and
+# the semaphore is rebuilt whenever it changes, so in-flight tasks finish
+# under the old limit while new acquisitions use the new one.
+DEFAULT_MAX_CONCURRENT = 8
+_MAX_CONCURRENT = DEFAULT_MAX_CONCURRENT
+_SEMS = {}
+
+def set_max_concurrent(n):
+    global _MAX_CONCURRENT
+    _MAX_CONCURRENT = n
+
+def request_sem():
+    loop = asyncio.get_running_loop()
+    limit, sem = _SEMS.get(loop, (None, None))
+    if limit != _MAX_CONCURRENT:
+        sem = asyncio.Semaphore(_MAX_CONCURRENT)
+        _SEMS[loop] = (_MAX_CONCURRENT, sem)
+    return sem
+
+async def achat(model, temperature, messages, max_tokens, response_format=None, usage_key=None, use_cache=True):
+    """Async twin of chat(); cache hits never leave the process. Runs on
+    the background loop, so the toggle value arrives as a parameter."""
+    async with request_sem():
+        if _should_cache(temperature, use_cache):
+            messages_json = orjson.dumps(messages, option=orjson.OPT_SORT_KEYS)
+            return await asyncio.to_thread(cached_chat, model, temperature, messages_json, max_tokens, response_format, usage_key)
+        kwargs = {"response_format": response_format} if response_format else {}
+        r = await awith_backoff(lambda: get_async_client().chat.completions.create(
+            model=model, temperature=temperature, messages=messages, max_tokens=max_tokens, **kwargs
+        ))
+        if usage_key and r.usage:
+            record_completion_tokens(usage_key, r.usage.completion_tokens)
+        return r.choices[0].message.content
 
 # === Minimal models ===
+# extra="forbid" sets additionalProperties: false in the generated JSON
+# schema, which OpenAI's strict structured-output mode requires.
 class SimpleArg(BaseModel):
+    model_config = ConfigDict(extra="forbid")
     argument: str
     evidence_hint: str
     famous_quote: str
 
-class SimpleArgList(BaseModel):
-    arguments: List[SimpleArg]
+class FullDebate(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    in_favour: List[SimpleArg]
+    against: List[SimpleArg]
+
+class Rebuttal(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    original_argument: str
+    answer: str
+
+class Rebuttals(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    rebuttals: List[Rebuttal]
+
+# === Server-enforced output schemas ===
+# With response_format=json_schema the API guarantees schema-valid JSON,
+# so the client-side validate-and-redo retry loops are gone.
+JSON_OBJECT = {"type": "json_object"}
+FULL_DEBATE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "FullDebate", "schema": FullDebate.model_json_schema(), "strict": True},
+}
+REBUTTALS_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "Rebuttals", "schema": Rebuttals.model_json_schema(), "strict": True},
+}
 
 # === 20 motions ===
 DEFAULT_MOTIONS = [
@@ -41,110 +294,226 @@ DEFAULT_MOTIONS = [
     "This House Believes success is luck, not hard work"
 ]
 
-# === generation prompt ===
-SYSTEM_SIMPLE = """
-You must ONLY output a JSON object with the following keys exactly:
+# === generation prompts ===
+SYSTEM_FULL = """
+You are preparing both sides of a school debate on the motion the user gives you.
+You must ONLY output a JSON object of the form:
 {
- "argument":"...",
- "evidence_hint":"...",
- "famous_quote":"..."
+ "in_favour": [
+  {"argument":"...", "evidence_hint":"...", "famous_quote":"..."},
+  ...
+ ],
+ "against": [
+  {"argument":"...", "evidence_hint":"...", "famous_quote":"..."},
+  ...
+ ]
 }
-Do not use extra keys, do not wrap in array, do not add explanations.
+"in_favour" must contain EXACTLY THREE strong arguments for the motion, one per angle, in this order:
+- Moral/ethical implications. The evidence hint should be specific, e.g., a philosophical principle, a historical precedent, or a legal framework.
+- Economic or practical benefits. The evidence hint should be specific, e.g., a specific economic model, a case study, or a policy impact report.
+- Broader societal or human developmental benefits. The evidence hint should be specific, e.g., a sociological trend, a psychological study, or a UN report.
+"against" must contain EXACTLY THREE ruthless opposing arguments that attack the *foundational assumptions* behind the motion. Do not hedge or show balance; argue the motion is fundamentally WRONG, harmful, misguided, or illogical. Each opposing evidence hint must be a very specific example, trend, or reference, and each famous quote short and sharp.
+Do not use extra keys, do not add explanations.
 """
 
-def generate_one_arg(user_prompt, retries=3):
-    # This function now takes the full user prompt as an argument
-    for i in range(1, retries+1):
-        try:
-            r = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role":"system","content":SYSTEM_SIMPLE},
-                          {"role":"user","content":user_prompt}],
-                max_tokens=350,temperature=0.7
-            )
-            raw = r.choices[0].message.content.strip()
-            return SimpleArg.model_validate_json(raw)
-        except Exception as e:
-            st.warning(f"Attempt {i}/{retries} failed to parse JSON from AI: {e}")
-            st.text(f"Raw AI Output: {raw}")
-    st.error(f"Failed all attempts. Final raw: {raw}")
-    return None
+# One register note per selectable style. The full system prompts are
+# assembled once at import rather than concatenated on every click, and
+# each variant stays byte-stable so provider prefix caching can hit.
+STYLE_NOTES = {
+    "wsdc": "Write in a formal WSDC register: clear signposting, principled clash, measured tone.",
+    "aggressive": "Write in a combative register: attack the premise head-on, short sharp sentences.",
+    "policy": "Write in a policy-debate register: mechanisms, stakeholders and cost-benefit framing.",
+    "rhetorical": "Write in a rhetorical register: vivid imagery, appeals to values, memorable phrasing.",
+}
+_SYSTEM_FULL_BY_STYLE = {s: SYSTEM_FULL + note + "\n" for s, note in STYLE_NOTES.items()}
+
+# === User-message templates, built once at import ===
+USER_TMPL_MOTION = Template('Motion: "$topic".')
+# Stable instructions first (system), dynamic values last (user): provider
+# prefix caching only hits on a byte-identical leading span, so the prompt
+# never interleaves invariant text with per-call content.
+SYSTEM_SCORE = """You are a debate coach. Score the rebuttal the user gives you (1–10 Logic,Evidence,Relevance,Style).
+Return JSON: {"Logic":7,"Evidence":6,"Relevance":8,"Style":5,"Suggestion":"..."}"""
+USER_TMPL_SCORE = Template('Opponent arg: "$opp_argument" Motion: "$topic" Rebuttal: "$text"')
+
+def _full_messages(topic, style="wsdc"):
+    return [{"role":"system","content":_SYSTEM_FULL_BY_STYLE[style]},
+            {"role":"user","content":USER_TMPL_MOTION.substitute(topic=topic)}]
+
+# === Ahead-of-time cache for the default motions ===
+# scripts/prewarm.py pre-generates all 20 default motions through the
+# Batch API and ships the results as cache/motions.json.gz; first-time
+# clicks on those motions never touch the API at all.
+PRELOAD_PATH = os.path.join(os.path.dirname(__file__), "cache", "motions.json.gz")
 
-def generate_opponents(topic, style, retries=3):
+@st.cache_resource
+def preloaded():
+    try:
+        with gzip.open(PRELOAD_PATH) as fh:
+            return orjson.loads(fh.read())
+    except OSError:
+        return {}
+
+async def generate_full_debate(topic, style="wsdc", stream_q=None, use_cache=True):
     """
-    Generates three truly opposing arguments designed to dismantle the motion.
+    Generates both sides of the debate - three in-favour arguments and
+    three opposing ones - in a single API call, so the whole Generate
+    button costs one round-trip and one system prompt.
     """
-    sys_prompt = f"""
-You are a ruthless debate opponent whose only goal is to DISPROVE the motion: "{topic}".
-You must present hard-hitting, critical arguments that attack the *foundational assumptions* behind the motion.
-
-DO NOT present reasons why the motion might partially work.
-DO NOT hedge or show balance.
-You must argue that the motion is fundamentally WRONG, harmful, misguided, or illogical.
-
-OUTPUT FORMAT ONLY:
-[
-  {{
-    "argument": "<one-sentence direct rebuttal>",
-    "evidence_hint": "<very specific example, trend, or reference>",
-    "famous_quote": "<short sharp quote>"
-  }},
-  ...
-]
+    # The prewarm file is generated in the default style only, and like
+    # every other cache it yields to the sidebar toggle: unchecking it
+    # must force a fresh roll even on the 20 default motions.
+    if use_cache and style == "wsdc":
+        pre = preloaded().get(topic)
+        if pre is not None:
+            return FullDebate.model_validate(pre)
 
-EXAMPLES of OPPOSITION:
-- Motion: "THBT social media is beneficial" -> Opp argument: "Social media destroys mental health by promoting addictive and anxiety-inducing behaviours."
-- Motion: "TH would ban zoos" -> Opp argument: "Zoos preserve endangered species far more effectively than leaving them in the wild."
+    sem_vec = None
+    if use_cache:
+        # A semantic-cache failure (embeddings outage surviving backoff)
+        # must degrade to plain generation, never abort the click.
+        try:
+            hit, sem_vec = await asyncio.to_thread(sem_lookup, f"full|{style}|{topic}")
+            if hit is not None:
+                return hit
+        except Exception:
+            sem_vec = None
 
-Now produce 3 such opposing arguments in the JSON format above.
-"""
-    user = f'Motion: "{topic}". Provide EXACTLY THREE opposing arguments, aiming to *destroy* this motion.'
+    messages = _full_messages(topic, style)
 
-    for i in range(1, retries + 1):
-        try:
-            r = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role":"system", "content": sys_prompt},
-                          {"role":"user", "content": user}],
-                max_tokens=650,
-                temperature=0.6
-            )
-            raw = r.choices[0].message.content.strip()
-            parsed_list = json.loads(raw)
-            arguments = [SimpleArg.model_validate(item) for item in parsed_list]
-            return SimpleArgList(arguments=arguments)
+    # Failures (API errors after backoff, schema-validation errors) are
+    # left to propagate: st.error on this loop thread would be silently
+    # dropped, so the script thread catches them at fut.result().
+    if stream_q is None:
+        raw = await achat(MODEL_GEN, 0.7, messages, max_tok("full"),
+                          response_format=FULL_DEBATE_FORMAT, usage_key="full",
+                          use_cache=use_cache)
+    else:
+        async with request_sem():
+            stream = await awith_backoff(lambda: get_async_client().chat.completions.create(
+                model=MODEL_GEN, messages=messages,
+                max_tokens=max_tok("full"), temperature=0.7, stream=True,
+                stream_options={"include_usage": True},
+                response_format=FULL_DEBATE_FORMAT
+            ))
+            chunks = []
+            async for chunk in stream:
+                # With include_usage the final chunk carries usage and an
+                # empty choices list.
+                if chunk.usage:
+                    record_completion_tokens("full", chunk.usage.completion_tokens)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    chunks.append(delta)
+                    stream_q.put(delta)
+            raw = "".join(chunks)
+    result = FullDebate.model_validate_json(raw)
+    if sem_vec is not None:
+        sem_store(sem_vec, result)
+    return result
 
-        except Exception as e:
-            st.warning(f"Attempt {i}/{retries} failed to parse JSON from AI: {e}")
-            st.text(f"Raw AI Output: {raw}")
+# === Bulk pre-generation via the Batch API ===
+# Generating all 20 default motions interactively would be 40 full-price
+# calls. The Batch API bills tokens at half price with its own rate-limit
+# pool; the trade-off is up to 24 h turnaround, which is fine for warming
+# the cache ahead of a class.
+def prebuild_batch():
+    lines = []
+    for i, motion in enumerate(DEFAULT_MOTIONS):
+        lines.append({"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions",
+                      "body": {"model": MODEL_GEN, "temperature": 0.7, "max_tokens": max_tok("full"),
+                               "messages": _full_messages(motion),
+                               "response_format": FULL_DEBATE_FORMAT}})
+    payload = b"\n".join(orjson.dumps(line) for line in lines)
+    f = get_client().files.create(file=("prebuild.jsonl", payload), purpose="batch")
+    batch = get_client().batches.create(input_file_id=f.id,
+                                        endpoint="/v1/chat/completions",
+                                        completion_window="24h")
+    return batch.id
 
-    st.error("Failed to generate and parse opponent arguments after multiple attempts.")
-    return SimpleArgList(arguments=[])
+def collect_batch(batch_id):
+    """Polls the batch; once complete, loads every result into the semantic
+    cache so interactive clicks on those motions are instant hits."""
+    batch = get_client().batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return batch.status, 0
+    out = get_client().files.content(batch.output_file_id)
+    loaded = 0
+    for line in out.text.splitlines():
+        rec = orjson.loads(line)
+        motion = DEFAULT_MOTIONS[int(rec["custom_id"])]
+        try:
+            content = rec["response"]["body"]["choices"][0]["message"]["content"]
+            result = FullDebate.model_validate_json(content)
+        except Exception:
+            continue
+        sem_store(_sem_embed(f"full|wsdc|{motion}"), result)
+        loaded += 1
+    return "completed", loaded
+
+# The sync calls that want a single JSON object back share the same
+# shape: system + user message, json_object mode, parse the response.
+def chat_json(system, user, max_tokens, temperature, usage_key=None, model=MODEL_GEN):
+    raw = chat(model, temperature,
+               [{"role":"system","content":system},{"role":"user","content":user}],
+               max_tokens, response_format=JSON_OBJECT, usage_key=usage_key)
+    return orjson.loads(raw)
 
 def score_rebuttal(text, opp_argument, topic):
-    sc=f"""Score this rebuttal (1–10 Logic,Evidence,Relevance,Style):
-Opponent arg: "{opp_argument}" Motion: "{topic}" Rebuttal: "{text}"
-Return JSON: {{"Logic":7,"Evidence":6,"Relevance":8,"Style":5,"Suggestion":"..."}}"""
-    r=openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role":"system","content":"debate coach"},{"role":"user","content":sc}],
-        max_tokens=200,temperature=0.3
-    )
-    return json.loads(r.choices[0].message.content.strip())
-
-def ai_rebuttal(arg_obj):
-    sys="""Only output JSON: {"original_argument":"...","answer":"..."}"""
-    u=f'Opponent: {arg_obj.argument}'
-    r=openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role":"system","content":sys},{"role":"user","content":u}],
-        max_tokens=300
-    )
-    return json.loads(r.choices[0].message.content.strip())
+    sc = USER_TMPL_SCORE.substitute(opp_argument=opp_argument, topic=topic, text=text)
+    return chat_json(SYSTEM_SCORE, sc, max_tok("score"), 0.3,
+                     usage_key="score", model=MODEL_SCORE)
+
+SYSTEM_REBUTTALS = """For EACH argument in the input array, produce one rebuttal.
+Return JSON: {"rebuttals":[{"original_argument":"...","answer":"..."}, ...]} in the same order as the input."""
+
+# Fired speculatively as soon as the opposition section renders, so that
+# by the time the user clicks any "Reveal AI rebuttal" the answers are
+# usually already sitting in the future. One batched call covers every
+# opposition argument, paying the system prompt once instead of N times.
+async def async_ai_rebuttals(args, use_cache=True):
+    user = orjson.dumps({"arguments": [a.model_dump() for a in args]}).decode()
+    raw = await achat(MODEL_GEN, 1.0,
+                      [{"role":"system","content":SYSTEM_REBUTTALS},{"role":"user","content":user}],
+                      max_tok("rebut"), response_format=REBUTTALS_FORMAT, usage_key="rebut",
+                      use_cache=use_cache)
+    return Rebuttals.model_validate_json(raw)
+
+def prefetch_ai_rebuttals(args):
+    """Schedules the batched rebuttal call on the background loop, keyed by
+    the argument texts so a stale future from a previous motion is never
+    served. Runs on the script thread, so it reads the cache toggle here
+    and hands the value to the coroutine."""
+    key = f"ai_reb_{hash(tuple(a.argument for a in args))}"
+    fut = st.session_state.get(key)
+    # A future that already failed would re-raise the same error on every
+    # Reveal click; drop it and schedule a fresh attempt instead.
+    if fut is not None and fut.done() and fut.exception() is not None:
+        fut = None
+    if fut is None:
+        fut = asyncio.run_coroutine_threadsafe(
+            async_ai_rebuttals(args, use_cache=_cache_enabled()), get_loop())
+        st.session_state[key] = fut
+    return fut
+
+# A 1-token probe at startup pays the DNS lookup and TCP+TLS handshake
+# before the first interactive click instead of on it, and leaves the
+# warmed connection in the shared pool.
+@st.cache_resource
+def _warm_openai():
+    try:
+        get_client().chat.completions.create(
+            model=MODEL_GEN,
+            messages=[{"role":"user","content":"ping"}],
+            max_tokens=1)
+    except Exception:
+        pass
+    return True
 
 # ==================== Streamlit UI =======================
 
 st.title("AI Debate Trainer (Simplified Version)")
+_warm_openai()
 
 if "topic" not in st.session_state:
     st.session_state['topic'] = ""
@@ -158,34 +527,62 @@ if st.button("🎲 Random Motion"):
     st.session_state['opponent_args'] = []
     st.session_state['my_args'] = []
 
+st.sidebar.checkbox("Reuse cached AI responses", value=True, key="use_cache")
+set_max_concurrent(st.sidebar.slider("Max concurrent requests", 1, 20, DEFAULT_MAX_CONCURRENT, key="max_concurrent"))
+
+with st.sidebar.expander("Admin: pre-generate motions"):
+    if st.button("Submit batch for all motions"):
+        st.session_state["batch_id"] = prebuild_batch()
+    if st.session_state.get("batch_id"):
+        st.caption(f"Batch: {st.session_state['batch_id']}")
+        if st.button("Check batch status"):
+            status, loaded = collect_batch(st.session_state["batch_id"])
+            if status == "completed":
+                st.success(f"Cached {loaded} pre-generated results")
+                del st.session_state["batch_id"]
+            else:
+                st.info(f"Batch status: {status}")
+
 topic = st.text_input("Debate Motion:", st.session_state.get("topic",""))
-style = st.selectbox("Style", ["wsdc","aggressive","policy","rhetorical"])
+style = st.selectbox("Style", list(STYLE_NOTES))
 
 if st.button("Generate Arguments (in favour)"):
     with st.spinner("Generating arguments..."):
         st.session_state['my_args']=[]
-        
-        # Argument 1: Moral/Ethical
-        p1 = f'Motion: "{topic}". Give one strong argument in favour, focused on moral or ethical implications. The evidence hint should be specific, e.g., a philosophical principle, a historical precedent, or a legal framework.'
-        x1 = generate_one_arg(p1)
-        if x1:
-            st.session_state['my_args'].append(x1)
-
-        # Argument 2: Economic/Practical
-        p2 = f'Motion: "{topic}". Give one strong argument in favour, focused on economic or practical benefits. The evidence hint should be specific, e.g., a specific economic model, a case study, or a policy impact report.'
-        x2 = generate_one_arg(p2)
-        if x2:
-            st.session_state['my_args'].append(x2)
-
-        # Argument 3: Societal/Developmental
-        p3 = f'Motion: "{topic}". Give one strong argument in favour, focused on broader societal or human developmental benefits. The evidence hint should be specific, e.g., a sociological trend, a psychological study, or a UN report.'
-        x3 = generate_one_arg(p3)
-        if x3:
-            st.session_state['my_args'].append(x3)
-
-        opponent_args_list = generate_opponents(topic, style)
-        if opponent_args_list:
-            st.session_state['opponent_args'] = opponent_args_list.arguments
+
+        # Both sides come back from a single fused completion scheduled on
+        # the shared background loop - no per-click event-loop setup and
+        # teardown, and the same loop, client, and connection pool as the
+        # rebuttal prefetches. Deltas stream back through a queue so the
+        # user sees text within the first few hundred milliseconds rather
+        # than after the full completion.
+        stream_q = queue.Queue()
+        fut = asyncio.run_coroutine_threadsafe(
+            generate_full_debate(topic, style, stream_q=stream_q,
+                                 use_cache=_cache_enabled()), get_loop())
+        fut.add_done_callback(lambda _: stream_q.put(None))
+
+        def deltas():
+            while (d := stream_q.get()) is not None:
+                yield d
+
+        preview = st.empty()
+        with preview:
+            st.write_stream(deltas)
+        preview.empty()
+
+        try:
+            debate = fut.result()
+        except Exception as e:
+            st.error(f"Failed to generate debate: {e}")
+            debate = None
+        if debate:
+            st.session_state['my_args'] = debate.in_favour
+            st.session_state['opponent_args'] = debate.against
+            # Drop scores, revealed rebuttals and prefetch futures that
+            # belong to the previous motion's opposition blocks.
+            for k in [k for k in st.session_state if k.startswith(("score_", "ai_answer_", "ai_reb_"))]:
+                del st.session_state[k]
 
 if st.session_state['my_args']:
     st.header("Your Arguments:")
@@ -198,6 +595,11 @@ if st.session_state['my_args']:
 if st.session_state['opponent_args']:
     st.divider()
     st.header("Simulated Opponent:")
+
+    # Start generating all AI rebuttals now, in one batched call; the
+    # reveal buttons below usually only read an already-finished future.
+    rebuttals_future = prefetch_ai_rebuttals(st.session_state['opponent_args'])
+
     for idx, arg in enumerate(st.session_state['opponent_args']):
         st.subheader(f"Opposition {idx+1}:")
         st.write(arg.argument)
@@ -206,11 +608,26 @@ if st.session_state['opponent_args']:
 
         reb=st.text_area("Your rebuttal:", key=f"rr_{idx}")
         col1, col2 = st.columns(2)
+        # Any widget interaction reruns the whole script, so results are
+        # written to session_state on the click and rendered from it
+        # unconditionally: typing in another rebuttal box or clicking a
+        # different button never re-fires these calls.
         with col1:
             if st.button("Score rebuttal", key=f"s_{idx}"):
                 with st.spinner("Scoring..."):
-                    st.json(score_rebuttal(reb,arg.argument,topic))
+                    st.session_state[f"score_{idx}"] = score_rebuttal(reb,arg.argument,topic)
+            if st.session_state.get(f"score_{idx}") is not None:
+                st.json(st.session_state[f"score_{idx}"])
         with col2:
             if st.button("Reveal AI rebuttal", key=f"a_{idx}"):
                 with st.spinner("Generating AI rebuttal..."):
-                    st.json(ai_rebuttal(arg))
+                    try:
+                        rebs = rebuttals_future.result(timeout=30).rebuttals
+                        if idx < len(rebs):
+                            st.session_state[f"ai_answer_{idx}"] = rebs[idx].model_dump()
+                        else:
+                            st.error("The AI returned fewer rebuttals than arguments; try generating again.")
+                    except Exception as e:
+                        st.error(f"Failed to generate AI rebuttal: {e}")
+            if st.session_state.get(f"ai_answer_{idx}") is not None:
+                st.json(st.session_state[f"ai_answer_{idx}"])
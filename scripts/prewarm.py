@@ -0,0 +1,76 @@
+"""Pre-generates the full debate payload for every default motion.
+
+Run offline (e.g. before deploying, or overnight before a class):
+
+    OPENAI_API_KEY=sk-... python scripts/prewarm.py
+
+Submits one Batch API request per motion (half-price tokens), waits for
+the batch to finish, and writes cache/motions.json.gz. The app loads
+that file at startup and serves those motions without any API call.
+"""
+import gzip
+import os
+import sys
+import time
+
+import orjson
+from openai import OpenAI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app import (  # noqa: E402
+    DEFAULT_MOTIONS, FULL_DEBATE_FORMAT, MODEL_GEN, _DEFAULT_MAX_TOK, _full_messages,
+)
+
+OUT_PATH = os.path.join(os.path.dirname(__file__), "..", "cache", "motions.json.gz")
+POLL_SECONDS = 60
+
+
+def main():
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+
+    lines = [
+        {"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions",
+         "body": {"model": MODEL_GEN, "temperature": 0.7,
+                  "max_tokens": _DEFAULT_MAX_TOK["full"],
+                  "messages": _full_messages(motion),
+                  "response_format": FULL_DEBATE_FORMAT}}
+        for i, motion in enumerate(DEFAULT_MOTIONS)
+    ]
+    payload = b"\n".join(orjson.dumps(line) for line in lines)
+
+    f = client.files.create(file=("prewarm.jsonl", payload), purpose="batch")
+    batch = client.batches.create(input_file_id=f.id,
+                                  endpoint="/v1/chat/completions",
+                                  completion_window="24h")
+    print(f"Submitted batch {batch.id} with {len(lines)} motions")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+        print(f"Batch status: {batch.status}")
+
+    if batch.status != "completed":
+        raise SystemExit(f"Batch ended in status {batch.status}")
+
+    out = client.files.content(batch.output_file_id)
+    motions = {}
+    for line in out.text.splitlines():
+        rec = orjson.loads(line)
+        motion = DEFAULT_MOTIONS[int(rec["custom_id"])]
+        # An errored line has response None; skip it rather than discard
+        # the whole run after waiting out the batch.
+        try:
+            content = rec["response"]["body"]["choices"][0]["message"]["content"]
+            motions[motion] = orjson.loads(content)
+        except Exception:
+            print(f"Skipping failed motion: {motion!r}")
+            continue
+
+    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
+    with gzip.open(OUT_PATH, "wb") as fh:
+        fh.write(orjson.dumps(motions))
+    print(f"Wrote {len(motions)} motions to {OUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()